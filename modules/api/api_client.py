@@ -1,19 +1,55 @@
 import tarfile
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import io
 import datetime
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, Any, List, Optional, Dict
+from functools import lru_cache, singledispatch
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Any, Iterable, List, NamedTuple, Optional, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard library
+    orjson = None
 
 
 DATE_FORMAT = "%Y-%m-%d"
 
+# A Retry-After longer than this is cut short, so one throttled response can't
+# park a download worker (or the caller of a GET) for as long as the server asks
+_MAX_RETRY_AFTER_SECONDS = 30
+
+
+class _Retry(Retry):
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, _MAX_RETRY_AFTER_SECONDS)
+
+
+# Transient failures on reads are retried by urllib3 with exponential backoff,
+# honouring Retry-After up to a limit. Only GET and HEAD are retried since the
+# listing endpoints are POSTs. The last response is returned rather than raised
+# so _do still reports it through raise_for_status.
+_RETRY = _Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 502, 503, 504),
+                allowed_methods=frozenset(('GET', 'HEAD')), respect_retry_after_header=True,
+                raise_on_status=False)
 
-class Filter:
-    def __init__(self, field: str, value: str):
-        self.field = field
-        self.value = value
+# Ranged downloads are copied into the writer in pieces of this size, so a
+# worker never holds a whole chunk in memory
+_DOWNLOAD_READ_SIZE = 1 << 20
+
+# NDJSON lines are decoded with orjson when it is installed, it accepts bytes and str alike
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+class Filter(NamedTuple):
+    field: str
+    value: str
 
     def to_dict(self):
         return {
@@ -22,43 +58,102 @@ class Filter:
         }
 
 
+@singledispatch
+def _normalize_filters(filters) -> List[Filter]:
+    return list(filters)
+
+
+@_normalize_filters.register(dict)
+def _(filters: Dict[str, str]) -> List[Filter]:
+    return [Filter(field, value) for field, value in filters.items()]
+
+
+@_normalize_filters.register(type(None))
+def _(filters: None) -> List[Filter]:
+    return []
+
 
 class Request:
+    __slots__ = ('_since', '_since_iso', 'fields', '_filters', 'limit', 'parts', 'offsets',
+                 '_since_per_partition')
+
     def __init__(self,
                  since: Optional[datetime.datetime] = None,
                  fields: Optional[List[str]] = None,
-                 filters: Optional[List[Filter]] = None,
+                 filters: Optional[Union[List[Filter], Dict[str, str]]] = None,
                  limit: Optional[int] = None,
                  parts: Optional[List[int]] = None,
                  offsets: Optional[Dict[int, int]] = None,
                  since_per_partition: Optional[Dict[int, datetime.datetime]] = None):
         self.since = since
         self.fields = fields or []
-        self.filters = filters or []
+        self.filters = filters
         self.limit = limit
         self.parts = parts or []
         self.offsets = offsets or {}
-        self.since_per_partition = since_per_partition or {}
+        self.since_per_partition = since_per_partition
 
-    def to_json(self):
-        # Build the dictionary without any empty or None values
-        result = {
-            'since': self.since.isoformat() if self.since else None,
-            'fields': self.fields if self.fields else None,
-            'filters': [f.to_dict() for f in self.filters] if self.filters else None,
-            'limit': self.limit,
-            'parts': self.parts if self.parts else None,
-            'offsets': self.offsets if self.offsets else None,
-            'since_per_partition': {k: v.isoformat() for k, v in self.since_per_partition.items()} if self.since_per_partition else None
-        }
+    @property
+    def since(self) -> Optional[datetime.datetime]:
+        return self._since
+
+    @since.setter
+    def since(self, value: Optional[datetime.datetime]):
+        self._since = value
+        self._since_iso = value.isoformat() if value is not None else None
 
-        # Remove keys with None or empty values
-        return {k: v for k, v in result.items() if v not in [None, [], {}, '']}
+    @property
+    def filters(self) -> List[Filter]:
+        return self._filters
+
+    @filters.setter
+    def filters(self, value: Optional[Union[List[Filter], Dict[str, str]]]):
+        # Always a new list, so later changes to the caller's list don't leak into the request
+        self._filters = _normalize_filters(value)
+
+    @property
+    def since_per_partition(self) -> Dict[int, datetime.datetime]:
+        return self._since_per_partition
+
+    @since_per_partition.setter
+    def since_per_partition(self, value: Optional[Dict[int, datetime.datetime]]):
+        self._since_per_partition = value or {}
+
+    def to_json(self):
+        # Built fresh on every call, so the caller may modify the result and
+        # in-place changes to the fields are always picked up.
+        # Only emit the fields that are set; empty collections are left out
+        return {key: value for key, value in (
+            ('since', self._since_iso),
+            ('fields', list(self.fields) or None),
+            ('filters', [f.to_dict() for f in self._filters] or None),
+            ('limit', self.limit),
+            ('parts', list(self.parts) or None),
+            ('offsets', dict(self.offsets) or None),
+            ('since_per_partition', {k: v.isoformat() for k, v in self._since_per_partition.items()} or None),
+        ) if value is not None}
+
+    def to_json_bytes(self) -> bytes:
+        # Encoded on every call: offsets and since_per_partition are routinely
+        # updated in place to resume a stream, and those edits must be sent.
+        if orjson is not None:
+            # offsets and since_per_partition are keyed by partition number
+            return orjson.dumps(self.to_json(), option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(self.to_json()).encode('utf-8')
+
+
+@lru_cache(maxsize=8)
+def _shared_adapter(pool_maxsize: int) -> HTTPAdapter:
+    # The adapter owns the connection pools, so clients with the same
+    # concurrency share one and reuse each other's kept-alive connections.
+    # It keeps enough connections for every concurrent chunk download; the
+    # default pool holds 10, and extra connections get closed after each
+    # request instead of being reused.
+    return HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, max_retries=_RETRY)
 
 
 class Client:
     def __init__(self, **kwargs):
-        self.http_client = requests.Session()
         self.user_agent = kwargs.get('user_agent', "")
         self.base_url = kwargs.get('base_url', "https://api.enterprise.wikimedia.com/")
         self.realtime_url = kwargs.get('realtime_url', "https://realtime.enterprise.wikimedia.com/")
@@ -68,8 +163,18 @@ class Client:
         self.download_concurrency = kwargs.get('download_concurrency', 10)
         self.scanner_buffer_size = kwargs.get('scanner_buffer_size', 20971520)
 
+        # A session can be shared between clients (or replaced in tests)
+        self.http_client = kwargs.get('http_client') or self._new_session()
+
+    def _new_session(self) -> requests.Session:
+        adapter = _shared_adapter(self.download_concurrency)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
     def _new_request(self, url: str, method: str, path: str, req: Optional[Request]) -> requests.Request:
-        data = json.dumps(req.to_json()) if req else ''
+        data = req.to_json_bytes() if req else b''
         headers = {
             'User-Agent': self.user_agent,
             'Content-Type': 'application/json',
@@ -77,37 +182,63 @@ class Client:
         }
         return requests.Request(method, f"{url}v2/{path}", data=data, headers=headers)
 
-    def _do(self, req: requests.Request) -> requests.Response:
+    def _do(self, req: requests.Request, stream: bool = False) -> requests.Response:
         prepared = self.http_client.prepare_request(req)
-        response = self.http_client.send(prepared)
-        response.raise_for_status()
-
+        response = self.http_client.send(prepared, stream=stream)
         try:
-            # Attempt to parse the JSON response
-            response.json()
-        except ValueError:
-            print("Failed to revoke token: Invalid or empty JSON response")
+            response.raise_for_status()
+        except requests.HTTPError:
+            # A streamed response holds its pooled connection until closed, and
+            # callers never see one that failed
+            response.close()
             raise
-
         return response
 
     def _get_entity(self, req: Optional[Request], path: str, val: Any):
         request = self._new_request(self.base_url, 'POST', path, req)
         response = self._do(request)
-        json_response = response.json()
+        # Decode the raw body directly, orjson takes bytes without a text decode first
+        json_response = _loads(response.content)
 
         if isinstance(val, list) and isinstance(json_response, list):
-            val.extend(json_response)  # If both are lists
+            # The wrappers always pass a fresh list, so take the whole page in one go
+            if val:
+                val.extend(json_response)
+            else:
+                val[:] = json_response
         elif isinstance(val, dict) and isinstance(json_response, dict):
             val.update(json_response)  # If both are dicts
         else:
             raise TypeError("Incompatible types for val and json_response")
 
     def _read_loop(self, rdr: io.BytesIO, cbk: Callable[[dict], Any]):
-        scanner = io.TextIOWrapper(rdr, buffer_size=self.scanner_buffer_size)
-        for line in scanner:
-            article = json.loads(line)
-            cbk(article)
+        self._scan_lines(iter(lambda: rdr.read(self.scanner_buffer_size), b''), cbk)
+
+    def _scan_lines(self, blocks: Iterable[bytes], cbk: Callable[[dict], Any]):
+        # Split each block of the payload on newlines in one call; the start
+        # of a line that runs past the end of a block is kept in `pending`
+        # until the rest of it arrives.
+        pending = []
+        for buf in blocks:
+            lines = buf.split(b'\n')
+            if len(lines) == 1:
+                pending.append(buf)
+                continue
+            if pending:
+                pending.append(lines[0])
+                lines[0] = b''.join(pending)
+                pending.clear()
+            tail = lines.pop()
+            if tail:
+                pending.append(tail)
+
+            for line in lines:
+                if line.strip():
+                    cbk(_loads(line))
+
+        line = b''.join(pending)
+        if line.strip():
+            cbk(_loads(line))
 
     def _read_entity(self, path: str, cbk: Callable[[dict], Any]):
         request = self._new_request(self.base_url, 'GET', path, None)
@@ -126,23 +257,51 @@ class Client:
         }
         return headers
 
-    def _download_entity(self, path: str, writer: io.BytesIO):
+    def _download_entity(self, path: str, writer: io.BytesIO) -> dict:
+        # The HEAD response is returned so callers can check what they got
+        # (size, ETag) without another round trip.
         headers = self._head_entity(path)
         content_length = headers['Content-Length']
+        if not content_length:
+            return headers
+
         chunk_size = min(self.download_chunk_size, content_length)
         chunks = [(i, min(i + chunk_size, content_length)) for i in range(0, content_length, chunk_size)]
 
+        # Workers share the writer, the lock keeps each seek paired with its write
+        lock = Lock()
+
         def download_chunk(start, end):
             req = self._new_request(self.base_url, 'GET', path, None)
-            req.headers['Range'] = f"bytes={start}-{end}"
-            res = self._do(req)
-            writer.seek(start)
-            writer.write(res.content)
+            # Range ends are inclusive
+            req.headers['Range'] = f"bytes={start}-{end - 1}"
+            res = self._do(req, stream=True)
+            try:
+                for piece in res.iter_content(chunk_size=_DOWNLOAD_READ_SIZE):
+                    with lock:
+                        writer.seek(start)
+                        writer.write(piece)
+                    start += len(piece)
+            finally:
+                res.close()
+
+        # Chunks complete out of order. Growing the writer to its final size up
+        # front lets every piece land in place instead of each write past the
+        # current end resizing (and copying) the buffer again.
+        writer.seek(content_length - 1)
+        writer.write(b'\0')
 
         with ThreadPoolExecutor(max_workers=self.download_concurrency) as executor:
             futures = [executor.submit(download_chunk, start, end) for start, end in chunks]
-            for future in futures:
-                future.result()
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        return headers
 
     def _subscribe_to_entity(self, path: str, req: Request, cbk: Callable[[dict], Any]):
         request = self._new_request(self.realtime_url, 'GET', path, req)
@@ -151,15 +310,22 @@ class Client:
             'Accept': 'application/x-ndjson',
             'Connection': 'keep-alive'
         })
-        response = self._do(request)
-        self._read_loop(io.BytesIO(response.content), cbk)
+        response = self._do(request, stream=True)
+        try:
+            # chunk_size=None hands over data as soon as it arrives instead of
+            # waiting for a full block, which a live stream may take a while to fill.
+            self._scan_lines(response.iter_content(chunk_size=None), cbk)
+        finally:
+            response.close()
 
     def read_all(self, rdr: io.BytesIO, cbk: Callable[[dict], Any]):
-        with tarfile.open(fileobj=rdr, mode='r:gz') as tar:
-            for member in tar.getmembers():
+        # Stream mode reads the archive front to back without building a member
+        # index, and each member is scanned straight from the decompressor.
+        with tarfile.open(fileobj=rdr, mode='r|gz') as tar:
+            for member in tar:
                 f = tar.extractfile(member)
                 if f:
-                    self._read_loop(io.BytesIO(f.read()), cbk)
+                    self._read_loop(f, cbk)
 
     def set_access_token(self, token: str):
         self.access_token = token
@@ -220,8 +386,8 @@ class Client:
     def read_batch(self, date: datetime.datetime, idr: str, cbk: Callable[[dict], Any]):
         self._read_entity(f"batches/{date.strftime(DATE_FORMAT)}/{idr}/download", cbk)
 
-    def download_batch(self, date: datetime.datetime, idr: str, writer: io.BytesIO):
-        self._download_entity(f"batches/{date.strftime(DATE_FORMAT)}/{idr}/download", writer)
+    def download_batch(self, date: datetime.datetime, idr: str, writer: io.BytesIO) -> dict:
+        return self._download_entity(f"batches/{date.strftime(DATE_FORMAT)}/{idr}/download", writer)
 
     def get_snapshots(self, req: Request) -> List[dict]:
         snapshots = []
@@ -239,8 +405,8 @@ class Client:
     def read_snapshot(self, idr: str, cbk: Callable[[dict], Any]):
         self._read_entity(f"snapshots/{idr}/download", cbk)
 
-    def download_snapshot(self, idr: str, writer: io.BytesIO):
-        self._download_entity(f"snapshots/{idr}/download", writer)
+    def download_snapshot(self, idr: str, writer: io.BytesIO) -> dict:
+        return self._download_entity(f"snapshots/{idr}/download", writer)
 
     def get_chunks(self, sid: str, req: Request) -> List[dict]:
         chunks = []
@@ -258,8 +424,8 @@ class Client:
     def read_chunk(self, sid: str, idr: str, cbk: Callable[[dict], Any]):
         self._read_entity(f"snapshots/{sid}/chunks/{idr}/download", cbk)
 
-    def download_chunk(self, sid: str, idr: str, writer: io.BytesIO):
-        self._download_entity(f"snapshots/{sid}/chunks/{idr}/download", writer)
+    def download_chunk(self, sid: str, idr: str, writer: io.BytesIO) -> dict:
+        return self._download_entity(f"snapshots/{sid}/chunks/{idr}/download", writer)
 
     def get_articles(self, name: str, req: Request) -> List[dict]:
         articles = []
@@ -288,8 +454,8 @@ class Client:
     def read_structured_snapshot(self, idr: str, cbk: Callable[[dict], Any]):
         self._read_entity(f"snapshots/structured-contents/{idr}/download", cbk)
 
-    def download_structured_snapshot(self, idr: str, writer: io.BytesIO):
-        self._download_entity(f"snapshots/structured-contents/{idr}/download", writer)
+    def download_structured_snapshot(self, idr: str, writer: io.BytesIO) -> dict:
+        return self._download_entity(f"snapshots/structured-contents/{idr}/download", writer)
 
     def stream_articles(self, req: Request, cbk: Callable[[dict], Any]):
         self._subscribe_to_entity("articles", req, cbk)
@@ -1,16 +1,98 @@
+import json
+import tarfile
 import unittest
-from unittest.mock import MagicMock, patch
+import requests
+from urllib3 import HTTPResponse
+from unittest.mock import Mock, patch
 from datetime import datetime
 from io import BytesIO
 
 from api_client import Client, Request, Filter
 
 
+HEAD_RESPONSE_HEADERS = {
+    'ETag': '"abc123"',
+    'Content-Type': 'application/gzip',
+    'Accept-Ranges': 'bytes',
+    'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT',
+    'Content-Length': '1024',
+}
+EXPECTED_HEAD_HEADERS = {
+    'ETag': 'abc123',
+    'Content-Type': 'application/gzip',
+    'Accept-Ranges': 'bytes',
+    'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT',
+    'Content-Length': 1024,
+}
+EXPECTED_NEW_REQUEST_BODY = {"since": "2024-01-01T00:00:00"}
+EXPECTED_NEW_REQUEST_HEADERS = {
+    'User-Agent': '',
+    'Content-Type': 'application/json',
+    'Authorization': 'Bearer test_access_token'
+}
+
+# Shared dates; datetime is immutable, so every test can reuse the same instances
+JAN_1 = datetime(2024, 1, 1)
+JAN_2 = datetime(2024, 1, 2)
+JAN_2_NOON = datetime(2024, 1, 2, 12)
+
+# (wrapper name, leading args, expected path, result type); the Request is appended at call time
+GET_WRAPPER_CASES = (
+    ('get_codes', (), "codes", list),
+    ('get_code', ("c1",), "codes/c1", dict),
+    ('get_languages', (), "languages", list),
+    ('get_language', ("en",), "languages/en", dict),
+    ('get_projects', (), "projects", list),
+    ('get_project', ("enwiki",), "projects/enwiki", dict),
+    ('get_namespaces', (), "namespaces", list),
+    ('get_namespace', (0,), "namespaces/0", dict),
+    ('get_batches', (JAN_1,), "batches/2024-01-01", list),
+    ('get_batch', (JAN_1, "enwiki_namespace_0"), "batches/2024-01-01/enwiki_namespace_0", dict),
+    ('get_snapshots', (), "snapshots", list),
+    ('get_snapshot', ("enwiki_namespace_0",), "snapshots/enwiki_namespace_0", dict),
+    ('get_chunks', ("enwiki_namespace_0",), "snapshots/enwiki_namespace_0/chunks", list),
+    ('get_chunk', ("enwiki_namespace_0", "chunk_0"), "snapshots/enwiki_namespace_0/chunks/chunk_0", dict),
+    ('get_articles', ("Montreal",), "articles/Montreal", list),
+    ('get_structured_contents', ("Montreal",), "structured-contents/Montreal", list),
+    ('get_structured_snapshots', (), "snapshots/structured-contents/", list),
+    ('get_structured_snapshot', ("enwiki_namespace_0",), "snapshots/structured-contents/enwiki_namespace_0", dict),
+)
+
+# (entity, leading args, expected download path) shared by the head_*, read_* and download_* wrappers
+ACTION_WRAPPER_CASES = (
+    ('batch', (JAN_1, "enwiki_namespace_0"), "batches/2024-01-01/enwiki_namespace_0/download"),
+    ('snapshot', ("enwiki_namespace_0",), "snapshots/enwiki_namespace_0/download"),
+    ('chunk', ("enwiki_namespace_0", "chunk_0"), "snapshots/enwiki_namespace_0/chunks/chunk_0/download"),
+    ('structured_snapshot', ("enwiki_namespace_0",), "snapshots/structured-contents/enwiki_namespace_0/download"),
+)
+
+
+def _resp(json_body=None, **kwargs):
+    # Mock responses only need the few attributes a test reads, so no spec= is used
+    response = Mock(**kwargs)
+    if json_body is not None:
+        response.content = json.dumps(json_body).encode('utf-8')
+    return response
+
+
 class TestClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Compressing the archive is the slow part, so it is built once and
+        # every test reads from its own BytesIO over the same bytes.
+        buf = BytesIO()
+        with tarfile.open(fileobj=buf, mode='w:gz') as tar:
+            for name, data in (("a.ndjson", b'{"id": 1}\n{"id": 2}\n'), ("b.ndjson", b'{"id": 3}\n')):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, BytesIO(data))
+            directory = tarfile.TarInfo("dir")
+            directory.type = tarfile.DIRTYPE
+            tar.addfile(directory)
+        cls.tar_bytes = buf.getvalue()
+
     def setUp(self):
-        self.client = Client()
-        self.client.http_client = MagicMock()
-        self.client.access_token = "test_access_token"
+        self.client = Client(http_client=Mock(), access_token="test_access_token")
 
     def test_init(self):
         # Test default values
@@ -44,29 +126,42 @@ class TestClient(unittest.TestCase):
         self.assertEqual(client.download_concurrency, 5)
         self.assertEqual(client.scanner_buffer_size, 10000)
 
+        adapter = client.http_client.get_adapter("https://api.enterprise.wikimedia.com/")
+        self.assertEqual(adapter._pool_maxsize, 5)
+        self.assertEqual(adapter.max_retries.status_forcelist, (429, 502, 503, 504))
+        self.assertEqual(adapter.max_retries.allowed_methods, frozenset(('GET', 'HEAD')))
+
+        # Retry-After is honoured, but never for longer than the cap, also on the
+        # copies urllib3 makes for each attempt
+        retry = adapter.max_retries.new(total=2)
+        for retry_after, expected in (("5", 5), ("3600", 30)):
+            response = HTTPResponse(headers={'Retry-After': retry_after})
+            self.assertEqual(retry.get_retry_after(response), expected)
+
+        # Clients with the same concurrency share the pooled adapter
+        self.assertIs(Client(download_concurrency=5).http_client.get_adapter("https://api.enterprise.wikimedia.com/"),
+                      adapter)
+
+        # A provided session is used as-is
+        session = Mock()
+        self.assertIs(Client(http_client=session).http_client, session)
+
     def test_new_request(self):
-        req = Request(since=datetime(2024, 1, 1))
+        req = Request(since=JAN_1)
         url = "https://api.example.com"
         method = "POST"
         path = "test_path"
 
-        expected_data = '{"since": "2024-01-01T00:00:00", "fields": [], "filters": [], "limit": null, "parts": [], "offsets": {}, "since_per_partition": {}}'
-        expected_headers = {
-            'User-Agent': '',
-            'Content-Type': 'application/json',
-            'Authorization': 'Bearer test_access_token'
-        }
-
         request = self.client._new_request(url, method, path, req)
 
         self.assertEqual(request.url, f"{url}v2/{path}")
         self.assertEqual(request.method, method)
-        self.assertEqual(request.data, expected_data)
-        self.assertEqual(request.headers, expected_headers)
+        self.assertEqual(json.loads(request.data), EXPECTED_NEW_REQUEST_BODY)
+        self.assertEqual(request.headers, EXPECTED_NEW_REQUEST_HEADERS)
 
     def test_do(self):
-        request = MagicMock()
-        response = MagicMock()
+        request = Mock()
+        response = _resp()
         self.client.http_client.prepare_request.return_value = request
         self.client.http_client.send.return_value = response
 
@@ -74,22 +169,40 @@ class TestClient(unittest.TestCase):
 
         self.assertEqual(result, response)
         self.client.http_client.prepare_request.assert_called_once_with(request)
-        self.client.http_client.send.assert_called_once_with(request)
+        self.client.http_client.send.assert_called_once_with(request, stream=False)
+
+    def test_do_closes_failed_response(self):
+        response = _resp()
+        response.raise_for_status.side_effect = requests.HTTPError("404 Client Error")
+        self.client.http_client.send.return_value = response
+
+        with self.assertRaises(requests.HTTPError):
+            self.client._do(Mock(), stream=True)
+        response.close.assert_called_once()
 
     def test_get_entity(self):
         req = Request()
         path = "test_path"
         val = {}
 
-        response = MagicMock()
-        response.json.return_value = {"key": "value"}
-        self.client.http_client.send.return_value = response
+        self.client.http_client.send.return_value = _resp({"key": "value"})
 
         self.client._get_entity(req, path, val)
 
         self.assertEqual(val, {"key": "value"})
         self.client.http_client.send.assert_called_once()
 
+    def test_get_entity_extends_list_correctly(self):
+        self.client.http_client.send.return_value = _resp([{"identifier": "b"}, {"identifier": "c"}])
+
+        val = []
+        self.client._get_entity(Request(), "test_path", val)
+        self.assertEqual(val, [{"identifier": "b"}, {"identifier": "c"}])
+
+        val = [{"identifier": "a"}]
+        self.client._get_entity(Request(), "test_path", val)
+        self.assertEqual(val, [{"identifier": "a"}, {"identifier": "b"}, {"identifier": "c"}])
+
     # Add more tests for other methods in the Client class
 
     def test_read_loop(self):
@@ -97,59 +210,346 @@ class TestClient(unittest.TestCase):
         data = b'{"article1": "content1"}\n{"article2": "content2"}'
         mock_rdr = BytesIO(data)
 
-        # Create a mock callback function
-        mock_cbk = MagicMock()
+        # Record the parsed lines with a plain list instead of a mock callback
+        records = []
 
         # Call the _read_loop method
-        self.client._read_loop(mock_rdr, mock_cbk)
+        self.client._read_loop(mock_rdr, records.append)
 
         # Assertions
-        mock_cbk.assert_any_call({"article1": "content1"})
-        mock_cbk.assert_any_call({"article2": "content2"})
+        self.assertEqual(records, [{"article1": "content1"}, {"article2": "content2"}])
+
+    def test_read_loop_lines_across_buffer_boundaries(self):
+        client = Client(scanner_buffer_size=7)
+        data = b'{"id": 1, "name": "first"}\r\n\n{"id": 2, "name": "second"}\n'
+
+        records = []
+        client._read_loop(BytesIO(data), records.append)
+
+        self.assertEqual(records, [{"id": 1, "name": "first"}, {"id": 2, "name": "second"}])
+
+    def test_read_loop_many_lines(self):
+        client = Client(scanner_buffer_size=4096)
+        data = b''.join(b'{"id": %d}\n' % i for i in range(10000))
+
+        records = []
+        client._read_loop(BytesIO(data), records.append)
+
+        self.assertEqual(len(records), 10000)
+        self.assertEqual(records[0], {"id": 0})
+        self.assertEqual(records[-1], {"id": 9999})
+
+    def test_subscribe_to_entity_processes_stream_correctly(self):
+        response = _resp()
+        response.iter_content.return_value = iter(
+            [b'{"id": 1, "data": "fir', b'st"}\n{"id": 2', b', "data": "second"}\n'])
+        self.client.http_client.send.return_value = response
+
+        records = []
+        self.client._subscribe_to_entity("articles", Request(filters={"is_part_of.identifier": "enwiki"}),
+                                         records.append)
+
+        request = self.client.http_client.prepare_request.call_args[0][0]
+        self.assertEqual(request.url, self.client.realtime_url + "v2/articles")
+        self.assertEqual(request.headers['Accept'], 'application/x-ndjson')
+        self.assertTrue(self.client.http_client.send.call_args[1]['stream'])
+        response.iter_content.assert_called_once_with(chunk_size=None)
+        self.assertEqual(records, [{"id": 1, "data": "first"}, {"id": 2, "data": "second"}])
+        response.close.assert_called_once()
+
+    def test_read_all(self):
+        records = []
+        self.client.read_all(BytesIO(self.tar_bytes), records.append)
+
+        self.assertEqual(records, [{"id": 1}, {"id": 2}, {"id": 3}])
+
+    def test_read_all_raises_on_corrupt_archive(self):
+        with self.assertRaises(tarfile.ReadError):
+            self.client.read_all(BytesIO(self.tar_bytes[:len(self.tar_bytes) // 2]), [].append)
 
     def test_read_entity(self):
         # Create a mock callback function
-        mock_cbk = MagicMock()
+        mock_cbk = Mock()
+        self.client.http_client.send.return_value = _resp(content=b'{"article1": "content1"}\n')
 
         # Patch the _read_loop method to mock its behavior
-        with patch.object(self.client, '_read_loop', autospec=True) as mock_read_loop:
+        with patch.object(self.client, '_read_loop') as mock_read_loop:
             self.client._read_entity("test_path", mock_cbk)
 
             # Assertions
             mock_read_loop.assert_called_once()
-            self.assertEqual(mock_read_loop.call_args[0][0], self.client.base_url + "v2/test_path")
+            request = self.client.http_client.prepare_request.call_args[0][0]
+            self.assertEqual(request.url, self.client.base_url + "v2/test_path")
+            self.assertEqual(mock_read_loop.call_args[0][0].read(), b'{"article1": "content1"}\n')
             self.assertEqual(mock_read_loop.call_args[0][1], mock_cbk)
 
+    def test_head_entity_returns_parsed_headers(self):
+        self.client.http_client.send.return_value = _resp(headers=HEAD_RESPONSE_HEADERS)
+
+        headers = self.client._head_entity("snapshots/enwiki_namespace_0/download")
+
+        request = self.client.http_client.prepare_request.call_args[0][0]
+        self.assertEqual(request.method, 'HEAD')
+        self.assertEqual(headers, EXPECTED_HEAD_HEADERS)
+
+    def test_download_entity(self):
+        payload = b'0123456789'
+        client = Client(http_client=Mock(), download_chunk_size=4)
+        client.http_client.prepare_request.side_effect = lambda req: req
+
+        def send(req, stream=False):
+            self.assertTrue(stream)
+            start, end = req.headers['Range'][len('bytes='):].split('-')
+            content = payload[int(start):int(end) + 1]
+            response = _resp()
+            # Hand the chunk over in uneven pieces to check each lands at the right offset
+            response.iter_content.return_value = [content[:1], content[1:]]
+            return response
+
+        client.http_client.send.side_effect = send
+        writer = BytesIO()
+        head = {'Content-Length': len(payload)}
+        with patch.object(client, '_head_entity', return_value=head):
+            result = client._download_entity("test_path", writer)
+
+        self.assertEqual(writer.getvalue(), payload)
+        self.assertIs(result, head)
+        ranges = {call[0][0].headers['Range'] for call in client.http_client.send.call_args_list}
+        self.assertEqual(ranges, {'bytes=0-3', 'bytes=4-7', 'bytes=8-9'})
+
+    def test_download_entity_cancels_on_error(self):
+        self.client.download_chunk_size = 1
+        self.client.http_client.send.side_effect = RuntimeError("boom")
+        with patch.object(self.client, '_head_entity', return_value={'Content-Length': 3}):
+            with self.assertRaises(RuntimeError):
+                self.client._download_entity("test_path", BytesIO())
+
     # Add similar tests for other methods
 
+
+class TestClientWrappers(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The public wrappers only build paths and delegate, so the internals
+        # are patched once for the whole class rather than once per test.
+        cls.mocks = {}
+        for name in ('_get_entity', '_head_entity', '_read_entity', '_download_entity', '_subscribe_to_entity'):
+            patcher = patch.object(Client, name)
+            cls.mocks[name] = patcher.start()
+            cls.addClassCleanup(patcher.stop)
+        cls.client = Client(http_client=Mock())
+
+    def setUp(self):
+        for mock in self.mocks.values():
+            mock.reset_mock()
+
+    def test_all_get_entity_wrappers_call_correct_paths(self):
+        req = Request()
+        mock_get_entity = self.mocks['_get_entity']
+        methods = {name: getattr(self.client, name) for name, *_ in GET_WRAPPER_CASES}
+        for name, args, path, result_type in GET_WRAPPER_CASES:
+            with self.subTest(name):
+                result = methods[name](*args, req)
+
+                self.assertIsInstance(result, result_type)
+                self.assertIs(mock_get_entity.call_args[0][0], req)
+                self.assertEqual(mock_get_entity.call_args[0][1], path)
+                self.assertIs(mock_get_entity.call_args[0][2], result)
+
+    def test_all_action_wrappers_call_correct_paths(self):
+        cbk = Mock()
+        writer = BytesIO()
+        actions = (('head', '_head_entity', ()), ('read', '_read_entity', (cbk,)),
+                   ('download', '_download_entity', (writer,)))
+        methods = {(action, entity): getattr(self.client, f'{action}_{entity}')
+                   for action, *_ in actions for entity, *_ in ACTION_WRAPPER_CASES}
+        for entity, args, path in ACTION_WRAPPER_CASES:
+            for action, internal, extra in actions:
+                with self.subTest(f'{action}_{entity}'):
+                    result = methods[action, entity](*args, *extra)
+                    self.assertEqual(self.mocks[internal].call_args[0], (path, *extra))
+                    if action != 'read':
+                        self.assertIs(result, self.mocks[internal].return_value)
+
+    def test_stream_articles_calls_correct_path(self):
+        req = Request()
+        cbk = Mock()
+        self.client.stream_articles(req, cbk)
+        self.mocks['_subscribe_to_entity'].assert_called_once_with("articles", req, cbk)
+
+
 class TestRequest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.since = JAN_1
+        cls.fields = ["field1", "field2"]
+        cls.filters = [Filter("field", "value")]
+        cls.limit = 10
+        cls.parts = [1, 2, 3]
+        cls.offsets = {1: 10, 2: 20}
+        cls.since_per_partition = {1: JAN_1, 2: JAN_2}
+        cls.dict_filters = {'is_part_of.identifier': 'enwiki', 'namespace.identifier': '0'}
+        cls.expected_filters_json = [
+            {'field': 'is_part_of.identifier', 'value': 'enwiki'},
+            {'field': 'namespace.identifier', 'value': '0'},
+        ]
+
+    def _assert_request(self, req, expected):
+        for attr, value in expected.items():
+            self.assertEqual(getattr(req, attr), value, attr)
+
     def test_init(self):
-        # Test default values
-        req = Request()
+        full = {
+            'since': self.since,
+            'fields': self.fields,
+            'filters': self.filters,
+            'limit': self.limit,
+            'parts': self.parts,
+            'offsets': self.offsets,
+            'since_per_partition': self.since_per_partition,
+        }
+        defaults = {
+            'since': None,
+            'fields': [],
+            'filters': [],
+            'limit': None,
+            'parts': [],
+            'offsets': {},
+            'since_per_partition': {},
+        }
+        cases = (
+            ("defaults", {}, defaults),
+            ("full", full, full),
+        )
+        for name, kwargs, expected in cases:
+            with self.subTest(name):
+                self._assert_request(Request(**kwargs), expected)
+
+    def test_init_with_dict_filters(self):
+        req = Request(filters=self.dict_filters)
+        self.assertTrue(all(isinstance(f, Filter) for f in req.filters))
+        # dict filters keep their insertion order, so the list can be compared as-is
+        self.assertEqual(req.to_json()['filters'], self.expected_filters_json)
+
+    def test_init_with_tuple_filters(self):
+        req = Request(filters=(Filter("field", "value"),))
+        self.assertIsInstance(req.filters, list)
+        self.assertEqual(req.to_json()['filters'], [{'field': 'field', 'value': 'value'}])
+
+    def test_filters_in_place_changes(self):
+        filters = [Filter("field", "value")]
+        req = Request(filters=filters)
+        self.assertEqual(req.to_json()['filters'], [{'field': 'field', 'value': 'value'}])
+
+        # The request keeps its own list: appending to it is sent, appending to the caller's is not
+        req.filters.append(Filter("in_language.identifier", "en"))
+        filters.append(Filter("other", "value"))
+        self.assertEqual(req.to_json()['filters'], [
+            {'field': 'field', 'value': 'value'},
+            {'field': 'in_language.identifier', 'value': 'en'},
+        ])
+
+    def test_filters_reassignment(self):
+        req = Request(filters=[Filter("field", "value")])
+        req.filters = {'in_language.identifier': 'en'}
+        self.assertEqual(req.filters, [Filter('in_language.identifier', 'en')])
+        self.assertEqual(req.to_json(), {'filters': [{'field': 'in_language.identifier', 'value': 'en'}]})
+
+    def test_to_json(self):
+        self.assertEqual(Request().to_json(), {})
+
+        req = Request(
+            since=JAN_1,
+            fields=["name"],
+            filters=[Filter("in_language.identifier", "en")],
+            limit=0,
+            parts=[0],
+            offsets={0: 5},
+            since_per_partition={0: JAN_2},
+        )
+        self.assertEqual(req.to_json(), {
+            'since': '2024-01-01T00:00:00',
+            'fields': ["name"],
+            'filters': [{'field': 'in_language.identifier', 'value': 'en'}],
+            'limit': 0,
+            'parts': [0],
+            'offsets': {0: 5},
+            'since_per_partition': {0: '2024-01-02T00:00:00'},
+        })
+
+    def test_to_json_returns_a_new_payload(self):
+        req = Request(fields=["name"], offsets={0: 5})
+        payload = req.to_json()
+        payload['limit'] = 99
+        payload['fields'].append("url")
+        payload['offsets'][0] = 6
+        self.assertEqual(req.to_json(), {'fields': ["name"], 'offsets': {0: 5}})
+
+        req.limit = 1
+        self.assertEqual(req.to_json(), {'fields': ["name"], 'limit': 1, 'offsets': {0: 5}})
+
+    def test_to_json_bytes_follows_field_changes(self):
+        req = Request(limit=10, parts=[0], offsets={0: 100})
+        self.assertEqual(json.loads(req.to_json_bytes()), {"limit": 10, "parts": [0], "offsets": {"0": 100}})
+
+        req.limit = 20
+        req.offsets[0] = 250
+        self.assertEqual(json.loads(req.to_json_bytes()), {"limit": 20, "parts": [0], "offsets": {"0": 250}})
+
+    def test_to_json_bytes_encodes_partition_keys(self):
+        req = Request(offsets={1: 10}, since_per_partition={1: JAN_1})
+        self.assertEqual(json.loads(req.to_json_bytes()), {
+            'offsets': {'1': 10},
+            'since_per_partition': {'1': '2024-01-01T00:00:00'},
+        })
+
+    def test_to_json_bytes_without_orjson(self):
+        req = Request(fields=["name"], offsets={1: 10})
+        with patch('api_client.orjson', None):
+            body = req.to_json_bytes()
+        self.assertEqual(json.loads(body), {'fields': ["name"], 'offsets': {'1': 10}})
+
+    def test_to_json_skips_empty_collections(self):
+        req = Request(fields=[], filters={}, parts=[], offsets={}, since_per_partition={})
+        body = req.to_json()
+        for key in ('fields', 'filters', 'parts', 'offsets', 'since_per_partition'):
+            self.assertNotIn(key, body)
+
+        req.fields = ["name"]
+        self.assertEqual(req.to_json(), {'fields': ["name"]})
+
+    def test_since_reassignment(self):
+        req = Request(since=JAN_1)
+        req.since = JAN_2_NOON
+        self.assertEqual(req.since, JAN_2_NOON)
+        self.assertEqual(req.to_json(), {'since': '2024-01-02T12:00:00'})
+
+        req.since = None
         self.assertIsNone(req.since)
-        self.assertEqual(req.fields, [])
-        self.assertEqual(req.filters, [])
-        self.assertIsNone(req.limit)
-        self.assertEqual(req.parts, [])
-        self.assertEqual(req.offsets, {})
+        self.assertEqual(req.to_json(), {})
+
+    def test_since_per_partition_in_place_changes(self):
+        req = Request(since_per_partition={0: JAN_1})
+        req.since_per_partition[1] = JAN_2
+        self.assertEqual(req.to_json(), {'since_per_partition': {
+            0: '2024-01-01T00:00:00',
+            1: '2024-01-02T00:00:00',
+        }})
+
+    def test_since_per_partition_reassignment(self):
+        req = Request(since_per_partition={0: JAN_1})
+        req.since_per_partition = {1: JAN_2}
+        self.assertEqual(req.since_per_partition, {1: JAN_2})
+        self.assertEqual(req.to_json(), {'since_per_partition': {1: '2024-01-02T00:00:00'}})
+
+        req.since_per_partition = None
         self.assertEqual(req.since_per_partition, {})
+        self.assertEqual(req.to_json(), {})
+
+    def test_rejects_unknown_attributes(self):
+        with self.assertRaises(AttributeError):
+            Request().field = ["name"]
 
-        # Test custom values
-        since = datetime(2024, 1, 1)
-        fields = ["field1", "field2"]
-        filters = [Filter("field", "value")]
-        limit = 10
-        parts = [1, 2, 3]
-        offsets = {1: 10, 2: 20}
-        since_per_partition = {1: datetime(2024, 1, 1), 2: datetime(2024, 1, 2)}
-        req = Request(since, fields, filters, limit, parts, offsets, since_per_partition)
-        self.assertEqual(req.since, since)
-        self.assertEqual(req.fields, fields)
-        self.assertEqual(req.filters, filters)
-        self.assertEqual(req.limit, limit)
-        self.assertEqual(req.parts, parts)
-        self.assertEqual(req.offsets, offsets)
-        self.assertEqual(req.since_per_partition, since_per_partition)
 
 class TestFilter(unittest.TestCase):
     def test_init(self):
@@ -159,5 +559,12 @@ class TestFilter(unittest.TestCase):
         self.assertEqual(filter.field, field)
         self.assertEqual(filter.value, value)
 
+    def test_is_immutable_and_hashable(self):
+        filter = Filter(field="in_language.identifier", value="en")
+        with self.assertRaises(AttributeError):
+            filter.value = "de"
+        self.assertEqual(len({filter, Filter("in_language.identifier", "en")}), 1)
+        self.assertEqual(filter.to_dict(), {'field': 'in_language.identifier', 'value': 'en'})
+
 if __name__ == '__main__':
     unittest.main()
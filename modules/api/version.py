@@ -1,10 +1,18 @@
+from operator import itemgetter
 from typing import List, Optional
 from scores import Scores
 from editor import Editor
 from size import Size
 
+# Pulls every Version field out of a decoded record in a single call
+_VERSION_FIELDS = itemgetter('identifier', 'comment', 'tags', 'is_minor_edit', 'is_flagged_stable',
+                             'is_breaking_news', 'has_tag_needs_citation', 'scores', 'editor',
+                             'number_of_characters', 'size')
+
 
 class PreviousVersion:
+    __slots__ = ('identifier', 'number_of_characters')
+
     def __init__(self,
                  identifier: Optional[int] = None,
                  number_of_characters: Optional[int] = None):
@@ -13,6 +21,9 @@ class PreviousVersion:
 
 
 class Version:
+    __slots__ = ('identifier', 'comment', 'tags', 'is_minor_edit', 'is_flagged_stable', 'is_breaking_news',
+                 'has_tag_needs_citation', 'scores', 'editor', 'number_of_characters', 'size')
+
     def __init__(self,
                  identifier: Optional[int] = None,
                  comment: Optional[str] = None,
@@ -39,19 +50,20 @@ class Version:
 
     @staticmethod
     def from_json(data: dict) -> 'Version':
+        (identifier, comment, tags, is_minor_edit, is_flagged_stable, is_breaking_news,
+         has_tag_needs_citation, scores, editor, number_of_characters, size) = _VERSION_FIELDS(data)
         return Version(
-            # Initialize Version fields from data
-            data['identifier'],
-            data['comment'],
-            data['tags'],
-            data['is_minor_edit'],
-            data['is_flagged_stable'],
-            data['is_breaking_news'],
-            data['has_tag_needs_citation'],
-            Scores.from_json(data['scores']),
-            Editor.from_json(data['editor']),
-            data['number_of_characters'],
-            Size.from_json(data['size'])
+            identifier,
+            comment,
+            tags,
+            is_minor_edit,
+            is_flagged_stable,
+            is_breaking_news,
+            has_tag_needs_citation,
+            Scores.from_json(scores),
+            Editor.from_json(editor),
+            number_of_characters,
+            Size.from_json(size)
         )
 
     @staticmethod
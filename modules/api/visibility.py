@@ -1,7 +1,13 @@
+from operator import itemgetter
 from typing import Optional
 
+# Pulls every Visibility field out of a decoded record in a single call
+_VISIBILITY_FIELDS = itemgetter('text', 'editor', 'comment')
+
 
 class Visibility:
+    __slots__ = ('text', 'editor', 'comment')
+
     def __init__(self,
                  text: Optional[bool] = None,
                  editor: Optional[bool] = None,
@@ -12,11 +18,7 @@ class Visibility:
 
     @staticmethod
     def from_json(data: dict) -> 'Visibility':
-        return Visibility(
-            text=data['text'],
-            editor=data['editor'],
-            comment=data['comment']
-        )
+        return Visibility(*_VISIBILITY_FIELDS(data))
 
     @staticmethod
     def to_json(visibility: 'Visibility') -> dict:
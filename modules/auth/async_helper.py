@@ -0,0 +1,67 @@
+import asyncio
+import logging
+
+try:
+    from .helper import refresh_wait
+except ImportError:  # loaded as a top-level module, as the tests do
+    from helper import refresh_wait
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHelper:
+    """Keeps an AuthClient's token fresh from a task on the running event loop.
+
+    AuthClient itself is blocking, so logins and refreshes run in the loop's
+    default executor. Must be created inside a running event loop.
+    """
+
+    def __init__(self, auth_client, wait_seconds=None):
+        self.auth_client = auth_client
+        self.wait_seconds = wait_seconds
+        self.stop_event = asyncio.Event()
+        # Serializes the blocking calls, so waiting callers don't each take an executor thread
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def get_access_token(self):
+        remaining = self.auth_client.access_token_expires_in()
+        if remaining is not None and remaining > 0:
+            # A valid token is handed back by AuthClient without blocking
+            return self.auth_client.get_access_token()
+
+        async with self._lock:
+            return await self._run(self.auth_client.get_access_token)
+
+    def _next_wait(self, failures):
+        return refresh_wait(self.auth_client, self.wait_seconds, failures)
+
+    async def _run(self, func):
+        return await asyncio.get_running_loop().run_in_executor(None, func)
+
+    async def _refresh_loop(self):
+        failures = 0
+        while True:
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), self._next_wait(failures))
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                async with self._lock:
+                    if self.auth_client.access_token_expires_in() is None:
+                        await self._run(self.auth_client.get_access_token)
+                    else:
+                        await self._run(self.auth_client.renew_access_token)
+                failures = 0
+                logger.info("Token refreshed successfully")
+            except Exception as e:
+                failures += 1
+                logger.error(f"Failed to refresh token: {e}")
+
+    async def stop(self):
+        self.stop_event.set()
+        await self._task
+        # Revokes the stored refresh token and forgets it
+        await self._run(self.auth_client.clear_state)
@@ -1,96 +1,349 @@
 import os
 import json
+import base64
+import binascii
+import logging
+import time
 import requests
 from dotenv import load_dotenv
 from threading import Lock
-from datetime import datetime, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple, Optional
 
-# Load environment variables from .env file
-load_dotenv()
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard library
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+ACCESS_TOKEN_TTL_SECONDS = 24 * 3600
+REFRESH_TOKEN_TTL_SECONDS = 30 * 24 * 3600
+
+# Within this many seconds of expiry a token is stale: callers still get it
+# straight away while a refresh runs in the background
+STALE_MARGIN_SECONDS = 180
+
+# After a failed background refresh the next one waits this long, doubling
+# with every further failure, rather than starting on the very next call
+BACKGROUND_RETRY_WAIT_SECONDS = 5
+BACKGROUND_MAX_RETRY_WAIT_SECONDS = 60
+
+# Login and refresh are retried on connection errors and gateway failures,
+# backing off exponentially between attempts
+POST_ATTEMPTS = 3
+POST_RETRY_WAIT_SECONDS = 0.5
+POST_MAX_RETRY_WAIT_SECONDS = 4
+
+# Refreshes for every client run on shared threads, so a hung request must not
+# be allowed to hold them: connecting and each read are bounded separately
+POST_CONNECT_TIMEOUT_SECONDS = 10
+POST_READ_TIMEOUT_SECONDS = 30
+_RETRY_STATUSES = frozenset((502, 503, 504))
+
+
+@lru_cache(maxsize=1)
+def _shared_session() -> requests.Session:
+    # Every AuthClient talks to the same auth host, so they share one pool of
+    # kept-alive connections instead of each opening its own.
+    return requests.Session()
+
+
+@lru_cache(maxsize=1)
+def _refresh_executor() -> ThreadPoolExecutor:
+    # One worker is enough for the occasional background refresh of every AuthClient
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="wme-token-refresh")
+
+
+# Username and password, kept once both have been found
+_credentials = None
+
+
+def _env_credentials():
+    # The .env lookup walks up the directory tree, so it waits until an AuthClient
+    # is actually created instead of running on every import. Only a complete pair
+    # is kept: clients created before the credentials are set look them up again.
+    global _credentials
+    if _credentials is not None:
+        return _credentials
+
+    load_dotenv()
+    username, password = os.getenv("WME_USERNAME"), os.getenv("WME_PASSWORD")
+    if username and password:
+        _credentials = (username, password)
+    return username, password
+
+
+def _epoch(value) -> float:
+    # Stores written before timestamps were kept as epoch seconds hold ISO-8601 strings
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return value
+
+
+def _jwt_expiry(token: str) -> Optional[float]:
+    # Access tokens are JWTs; their exp claim is used for scheduling only, so
+    # the signature is not checked. Anything unreadable falls back to the TTL.
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (IndexError, KeyError, TypeError, ValueError, binascii.Error):
+        return None
+
+
+class TokenSnapshot(NamedTuple):
+    # Expiry times are epoch seconds and checked against time.time(). The exp
+    # claim and the stored timestamps are wall clock instants, and the wall
+    # clock keeps running while the machine is suspended, unlike time.monotonic()
+    # on Linux, so a token that expired during a suspend is seen as expired.
+    access_token: str
+    access_token_expires_at: float
+    refresh_token: str
+    refresh_token_expires_at: float
+
+    @classmethod
+    def from_store(cls, token_store: dict) -> 'TokenSnapshot':
+        access_token = token_store["access_token"]
+        access_token_expires_at = _jwt_expiry(access_token)
+        if access_token_expires_at is None:
+            access_token_expires_at = _epoch(token_store["access_token_generated_at"]) + ACCESS_TOKEN_TTL_SECONDS
+        return cls(access_token,
+                   access_token_expires_at,
+                   token_store["refresh_token"],
+                   _epoch(token_store["refresh_token_generated_at"]) + REFRESH_TOKEN_TTL_SECONDS)
 
 
 class AuthClient:
-    def __init__(self):
+    def __init__(self, token_store_file: Optional[str] = "tokenstore.json",
+                 session: Optional[requests.Session] = None):
         self.base_url = "https://auth.enterprise.wikimedia.com/v1"
-        self.token_store_file = "tokenstore.json"
+        # With no file the tokens are kept in memory only, e.g. for containers without persistent storage
+        self.token_store_file = token_store_file
         self.lock = Lock()
-        self.username = os.getenv("WME_USERNAME")
-        self.password = os.getenv("WME_PASSWORD")
+        # Every request reuses this session's pooled connection, so only the first pays for the TLS handshake
+        self.session = session if session is not None else _shared_session()
+        # Parsed copy of the token store, so a fresh token is served without touching
+        # the disk. It is immutable and only ever replaced whole, so readers always
+        # see a token together with its own expiry.
+        self._current = None
+        self._refresh_lock = Lock()
+        self._refresh_future = None
+        self._background_failures = 0
+        self._background_retry_at = 0.0
+        self.username, self.password = _env_credentials()
         if not self.username or not self.password:
             raise ValueError("Username or password not set in .env file")
 
-    def _post(self, url, data):
-        response = requests.post(f"{self.base_url}{url}", json=data)
-        response.raise_for_status()
-        if len(response.text) > 0:
+        # Load a stored token up front so the first get_access_token is served from
+        # memory. An unreadable store is left for get_access_token to report.
+        try:
+            self._load_tokens()
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _post(self, url, data, retry=False):
+        attempts = POST_ATTEMPTS if retry else 1
+        for attempt in range(attempts):
+            try:
+                response = self.session.post(f"{self.base_url}{url}", json=data,
+                                             timeout=(POST_CONNECT_TIMEOUT_SECONDS, POST_READ_TIMEOUT_SECONDS))
+                response.raise_for_status()
+                break
+            except requests.RequestException as e:
+                transient = isinstance(e, (requests.ConnectionError, requests.Timeout)) or (
+                    e.response is not None and e.response.status_code in _RETRY_STATUSES)
+                if not transient or attempt == attempts - 1:
+                    raise
+                time.sleep(min(POST_MAX_RETRY_WAIT_SECONDS, POST_RETRY_WAIT_SECONDS * 2 ** attempt))
+
+        # Revoking returns an empty body; check the raw bytes rather than decoding them to text first
+        if response.content:
             return response.json()
         return {}
 
     def login(self):
         data = {"username": self.username, "password": self.password}
-        return self._post("/login", data)
+        return self._post("/login", data, retry=True)
 
     def refresh_token(self, refresh_token):
         data = {"username": self.username, "refresh_token": refresh_token}
-        return self._post("/token-refresh", data)
+        return self._post("/token-refresh", data, retry=True)
 
     def revoke_token(self, refresh_token):
         data = {"refresh_token": refresh_token}
         self._post("/token-revoke", data)
 
     def get_access_token(self):
+        # A fresh or stale cached token is returned without the lock, so concurrent
+        # callers don't queue behind each other. Only an expired (or missing)
+        # token makes the caller wait for a new one, re-checked under the lock.
+        current = self._current
+        if current is not None:
+            remaining = current.access_token_expires_at - time.time()
+            if remaining > STALE_MARGIN_SECONDS:
+                return current.access_token
+            if remaining > 0:
+                self._refresh_in_background()
+                return current.access_token
+
+        # Callers arriving while a refresh is in flight (in the background or
+        # started by another caller) share its outcome, a failed refresh included,
+        # rather than each trying again once they get the lock.
+        with self._refresh_lock:
+            future = self._refresh_future
+            if future is None or future.done():
+                future = self._refresh_future = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            token = future.result()
+            if token is not None:
+                return token
+            # The background refresh found nothing to refresh, fetch one ourselves
+            with self.lock:
+                return self._fetch_access_token()
+
+        try:
+            with self.lock:
+                token = self._fetch_access_token()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(token)
+        return token
+
+    def _fetch_access_token(self):
+        # Callers hold self.lock
+        current = self._load_tokens()
+        if current is None:
+            return self._login_and_store_tokens()
+
+        now = time.time()
+        if now < current.access_token_expires_at:
+            return current.access_token
+
+        if now < current.refresh_token_expires_at:
+            return self._refresh_and_store_tokens(current.refresh_token)
+
+        return self._login_and_store_tokens()
+
+    def renew_access_token(self):
+        # Gets a new access token even if the current one is still valid, so it
+        # can be replaced before it expires.
         with self.lock:
-            if not os.path.exists(self.token_store_file):
-                return self._login_and_store_tokens()
+            return self._renew(self._load_tokens())
+
+    def _renew(self, current):
+        # Callers hold self.lock
+        if current is not None and time.time() < current.refresh_token_expires_at:
+            return self._refresh_and_store_tokens(current.refresh_token)
+
+        return self._login_and_store_tokens()
 
-            with open(self.token_store_file, 'r') as f:
-                token_store = json.load(f)
+    def _refresh_in_background(self):
+        with self._refresh_lock:
+            if self._refresh_future is not None and not self._refresh_future.done():
+                return
+            if time.monotonic() < self._background_retry_at:
+                return
+            self._refresh_future = _refresh_executor().submit(self._refresh_if_stale)
 
-            access_token_generated_at = datetime.fromisoformat(token_store["access_token_generated_at"])
-            refresh_token_generated_at = datetime.fromisoformat(token_store["refresh_token_generated_at"])
+    def _refresh_if_stale(self):
+        # A failure here is left on the future; once the token expires the
+        # blocking path in get_access_token retries and raises it to the caller.
+        try:
+            with self.lock:
+                current = self._current
+                if current is None or current.access_token_expires_at - time.time() > STALE_MARGIN_SECONDS:
+                    return current.access_token if current is not None else None
+                token = self._renew(current)
+        except Exception as e:
+            with self._refresh_lock:
+                self._background_failures += 1
+                backoff = BACKGROUND_RETRY_WAIT_SECONDS * 2 ** (self._background_failures - 1)
+                backoff = min(BACKGROUND_MAX_RETRY_WAIT_SECONDS, backoff)
+                self._background_retry_at = time.monotonic() + backoff
+            # Nobody waits on this future, so log the failure while the stale token is still served
+            logger.warning(f"Background token refresh failed, retrying in {backoff}s: {e}")
+            raise
 
-            if datetime.now() - access_token_generated_at < timedelta(hours=24):
-                return token_store["access_token"]
+        with self._refresh_lock:
+            self._background_failures = 0
+        return token
 
-            if datetime.now() - refresh_token_generated_at < timedelta(days=30):
-                return self._refresh_and_store_tokens(token_store["refresh_token"])
+    def access_token_expires_in(self):
+        # Seconds until the current access token expires, or None when no token is loaded
+        current = self._current
+        return current.access_token_expires_at - time.time() if current is not None else None
 
-            return self._login_and_store_tokens()
+    def _load_tokens(self):
+        if self._current is None and self.token_store_file and os.path.exists(self.token_store_file):
+            self._current = TokenSnapshot.from_store(self._read_store())
+        return self._current
+
+    def _read_store(self):
+        with open(self.token_store_file, 'rb') as f:
+            data = f.read()
+        return orjson.loads(data) if orjson is not None else json.loads(data)
 
     def _login_and_store_tokens(self):
         response = self.login()
+        now = time.time()
         token_store = {
             "access_token": response["access_token"],
-            "access_token_generated_at": datetime.now().isoformat(),
+            "access_token_generated_at": now,
             "refresh_token": response["refresh_token"],
-            "refresh_token_generated_at": datetime.now().isoformat()
+            "refresh_token_generated_at": now
         }
         self._store_tokens(token_store)
         return response["access_token"]
 
     def _refresh_and_store_tokens(self, refresh_token):
         response = self.refresh_token(refresh_token)
+        now = time.time()
         token_store = {
             "access_token": response["access_token"],
-            "access_token_generated_at": datetime.now().isoformat(),
+            "access_token_generated_at": now,
             "refresh_token": refresh_token,
-            "refresh_token_generated_at": datetime.now().isoformat()
+            "refresh_token_generated_at": now
         }
         self._store_tokens(token_store)
         return response["access_token"]
 
     def _store_tokens(self, token_store):
-        with open(self.token_store_file, 'w') as f:
-            json.dump(token_store, f)
+        if not self.token_store_file:
+            self._current = TokenSnapshot.from_store(token_store)
+            return
+
+        data = orjson.dumps(token_store) if orjson is not None else json.dumps(token_store).encode('utf-8')
+        # Written beside the store and renamed over it, so a crash mid-write
+        # leaves the previous tokens intact rather than an empty file. The
+        # store holds live credentials, so it is readable by the owner only.
+        tmp = f"{self.token_store_file}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self.token_store_file)
+        self._current = TokenSnapshot.from_store(token_store)
 
     def clear_state(self):
         with self.lock:
-            if not os.path.exists(self.token_store_file):
+            current, self._current = self._current, None
+            if not self.token_store_file:
+                if current is not None:
+                    self.revoke_token(current.refresh_token)
                 return
 
-            with open(self.token_store_file, 'r') as f:
-                token_store = json.load(f)
+            if not os.path.exists(self.token_store_file):
+                return
 
+            token_store = self._read_store()
             refresh_token = token_store.get("refresh_token")
             if refresh_token:
                 self.revoke_token(refresh_token)
@@ -0,0 +1,13 @@
+import pytest
+
+import auth_client
+
+
+@pytest.fixture(autouse=True)
+def env_credentials(monkeypatch):
+    # Every test starts from test credentials in the environment, with no .env
+    # lookup and nothing cached by an earlier test
+    monkeypatch.setenv("WME_USERNAME", "test_user")
+    monkeypatch.setenv("WME_PASSWORD", "test_pass")
+    monkeypatch.setattr(auth_client, "load_dotenv", lambda: None)
+    monkeypatch.setattr(auth_client, "_credentials", None)
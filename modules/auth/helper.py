@@ -1,35 +1,139 @@
 import logging
+import random
+import sched
 import threading
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The token is renewed once this share of its remaining lifetime has passed,
+# give or take the jitter, so processes sharing a login don't refresh in lockstep
+REFRESH_AT = 0.9
+REFRESH_JITTER_SECONDS = 300
+MIN_WAIT_SECONDS = 60
+
+# Failed refreshes are retried with exponential backoff instead of waiting for the next cycle,
+# each wait lengthened by up to RETRY_JITTER of itself so failing clients spread out
+RETRY_WAIT_SECONDS = 30
+MAX_RETRY_WAIT_SECONDS = 600
+RETRY_JITTER = 0.1
+
+# All helpers share one scheduler thread, started on first use. Entering an event
+# sets _wakeup so the thread re-checks the queue instead of sleeping past it.
+_wakeup = threading.Event()
+_scheduler_lock = threading.Lock()
+_scheduler_thread = None
+
+
+def _delay(seconds):
+    _wakeup.wait(seconds)
+    _wakeup.clear()
+
+
+_SHARED_SCHEDULER = sched.scheduler(time.monotonic, _delay)
+
+
+def _run_shared_scheduler():
+    while True:
+        try:
+            _SHARED_SCHEDULER.run()
+        except Exception as e:
+            logger.error(f"Scheduled token refresh failed: {e}")
+            continue
+        # The queue is empty, sleep until a helper enters a new event
+        _delay(None)
+
+
+def _wake_shared_scheduler():
+    global _scheduler_thread
+    with _scheduler_lock:
+        if _scheduler_thread is None:
+            _scheduler_thread = threading.Thread(target=_run_shared_scheduler, name="wme-token-scheduler",
+                                                 daemon=True)
+            _scheduler_thread.start()
+    _wakeup.set()
+
+
+def refresh_wait(auth_client, wait_seconds, failures):
+    # Seconds until the next refresh, shared by Helper and AsyncHelper
+    if failures:
+        if wait_seconds is None:
+            backoff = min(MAX_RETRY_WAIT_SECONDS, RETRY_WAIT_SECONDS * 2 ** (failures - 1))
+        else:
+            # A fixed period doubles with every failure, capped no lower than the period itself
+            cap = max(MAX_RETRY_WAIT_SECONDS, wait_seconds)
+            backoff = min(cap, wait_seconds * 2 ** failures)
+        return backoff + random.uniform(0, backoff * RETRY_JITTER)
+
+    if wait_seconds is not None:
+        return wait_seconds
+
+    remaining = auth_client.access_token_expires_in()
+    if remaining is None:
+        # Nothing loaded yet, fetch a token straight away
+        return 0
+
+    jitter = random.uniform(-REFRESH_JITTER_SECONDS, REFRESH_JITTER_SECONDS)
+    return max(MIN_WAIT_SECONDS, remaining * REFRESH_AT + jitter)
+
 
 class Helper:
-    def __init__(self, auth_client, wait_seconds=None):
+    def __init__(self, auth_client, wait_seconds=None, scheduler=None):
         self.auth_client = auth_client
-        self.lock = threading.Lock()
         self.stop_event = threading.Event()
-        # default is 23 hours and 59 minutes
-        self.wait_seconds = wait_seconds if wait_seconds is not None else 23 * 3600 + 59 * 60
-        self.refresh_thread = threading.Thread(target=self._refresh_token_periodically)
-        self.refresh_thread.start()
+        # A fixed wait_seconds refreshes on that period; by default the wait is
+        # worked out from when the current access token expires.
+        self.wait_seconds = wait_seconds
+        # A caller supplied sched.scheduler is run by the caller, the shared one by its own thread
+        self.scheduler = _SHARED_SCHEDULER if scheduler is None else scheduler
+        self._failures = 0
+        self._schedule_lock = threading.Lock()
+        self._scheduled_event = None
+        # Held for the whole of a refresh, so stop() can wait for one in flight
+        self._refresh_lock = threading.Lock()
+        self._schedule()
 
     def get_access_token(self):
-        with self.lock:
-            return self.auth_client.get_access_token()
+        # AuthClient is thread-safe on its own, an outer lock would only serialize readers
+        return self.auth_client.get_access_token()
+
+    def _next_wait(self, failures):
+        return refresh_wait(self.auth_client, self.wait_seconds, failures)
 
-    def _refresh_token_periodically(self):
-        while not self.stop_event.is_set():
-            if self.stop_event.wait(self.wait_seconds):
-                continue
+    def _schedule(self):
+        with self._schedule_lock:
+            if self.stop_event.is_set():
+                return
+            self._scheduled_event = self.scheduler.enter(self._next_wait(self._failures), 1, self._refresh_once)
+        if self.scheduler is _SHARED_SCHEDULER:
+            _wake_shared_scheduler()
+
+    def _refresh_once(self):
+        with self._refresh_lock:
+            if self.stop_event.is_set():
+                return
             try:
-                self.get_access_token()
+                if self.auth_client.access_token_expires_in() is None:
+                    self.auth_client.get_access_token()
+                else:
+                    self.auth_client.renew_access_token()
+                self._failures = 0
                 logger.info("Token refreshed successfully")
             except Exception as e:
+                self._failures += 1
                 logger.error(f"Failed to refresh token: {e}")
+        self._schedule()
 
     def stop(self):
-        self.stop_event.set()
-        self.refresh_thread.join()
-        self.auth_client.revoke_token()
+        with self._schedule_lock:
+            self.stop_event.set()
+            try:
+                self.scheduler.cancel(self._scheduled_event)
+            except ValueError:
+                pass  # already running, or cancelled by an earlier stop()
+        # A refresh already under way finishes first, otherwise it could log in
+        # again and store fresh tokens after they have been cleared
+        with self._refresh_lock:
+            # Revokes the stored refresh token and forgets it
+            self.auth_client.clear_state()
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import asyncio
+import importlib
+from unittest.mock import Mock, create_autospec, patch
+from async_helper import AsyncHelper
+from auth_client import AuthClient, TokenSnapshot
+
+
+def run_with_helper(mock_auth_client, test, wait_seconds=0.05):
+    # pytest-asyncio isn't a dependency, each test drives its own loop
+    async def main():
+        helper = AsyncHelper(mock_auth_client, wait_seconds=wait_seconds)
+        try:
+            await test(helper)
+        finally:
+            if not helper.stop_event.is_set():
+                await helper.stop()
+
+    asyncio.run(main())
+
+
+def make_auth_client():
+    auth_client = create_autospec(AuthClient, instance=True)
+    auth_client.get_access_token.return_value = "test_token"
+    auth_client.access_token_expires_in.return_value = 3600
+    return auth_client
+
+
+def logged(mock_log, message, times=1):
+    # An event set once `message` has been logged `times` times, so tests wait on
+    # the refresh itself rather than sleeping and hoping it happened
+    event = asyncio.Event()
+    count = [0]
+
+    def log(msg, *args, **kwargs):
+        if msg == message:
+            count[0] += 1
+            if count[0] >= times:
+                event.set()
+
+    mock_log.side_effect = log
+    return event
+
+
+def test_get_access_token():
+    auth_client = make_auth_client()
+
+    async def test(helper):
+        assert await helper.get_access_token() == "test_token"
+
+    run_with_helper(auth_client, test, wait_seconds=3600)
+    auth_client.get_access_token.assert_called_once()
+
+
+@patch('async_helper.logger')
+def test_refresh_token_periodically(mock_logger):
+    auth_client = make_auth_client()
+
+    async def test(helper):
+        refreshed = logged(mock_logger.info, "Token refreshed successfully", times=2)
+        await asyncio.wait_for(refreshed.wait(), timeout=3)
+
+    run_with_helper(auth_client, test)
+    assert auth_client.renew_access_token.call_count > 1
+    mock_logger.info.assert_called_with("Token refreshed successfully")
+
+
+@patch('async_helper.logger')
+def test_refresh_token_periodically_with_exception(mock_logger):
+    auth_client = make_auth_client()
+    auth_client.renew_access_token.side_effect = Exception("Test exception")
+
+    async def test(helper):
+        failed = logged(mock_logger.error, "Failed to refresh token: Test exception")
+        await asyncio.wait_for(failed.wait(), timeout=3)
+
+    run_with_helper(auth_client, test)
+    mock_logger.error.assert_called_with("Failed to refresh token: Test exception")
+
+
+def test_stop():
+    auth_client = make_auth_client()
+
+    async def test(helper):
+        await helper.stop()
+        assert helper._task.done()
+
+    run_with_helper(auth_client, test, wait_seconds=3600)
+    auth_client.clear_state.assert_called_once_with()
+    auth_client.renew_access_token.assert_not_called()
+
+
+def test_stop_revokes_refresh_token():
+    with patch('requests.Session.post', return_value=Mock(content=b"")) as mock_post:
+        auth_client = AuthClient(token_store_file=None)
+        auth_client._current = TokenSnapshot("access_token", time.time() + 3600,
+                                             "refresh_token", time.time() + 3600)
+
+        async def test(helper):
+            await helper.stop()
+
+        run_with_helper(auth_client, test, wait_seconds=3600)
+
+    mock_post.assert_called_once_with("https://auth.enterprise.wikimedia.com/v1/token-revoke",
+                                      json={"refresh_token": "refresh_token"}, timeout=(10, 30))
+    assert auth_client.access_token_expires_in() is None
+
+
+def test_import_through_package(monkeypatch):
+    # The examples import the SDK as the modules.auth package rather than as top-level
+    # modules, so the auth directory itself must not be importable from here
+    auth_dir = os.path.dirname(os.path.abspath(__file__))
+    repo_root = os.path.dirname(os.path.dirname(auth_dir))
+    monkeypatch.setattr(sys, 'path', [repo_root] + [p for p in sys.path if os.path.abspath(p or '.') != auth_dir])
+    for name in ("helper", "modules.auth.helper", "modules.auth.async_helper"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    async_helper = importlib.import_module("modules.auth.async_helper")
+    assert async_helper.refresh_wait is importlib.import_module("modules.auth.helper").refresh_wait
@@ -1,16 +1,19 @@
 import os
 import json
+import base64
+import time
 import pytest
+import requests
+import threading
 
-from unittest.mock import patch, mock_open
+from unittest.mock import MagicMock, patch, mock_open
 from datetime import datetime, timedelta
-from auth_client import AuthClient  # Adjust this import to match your project structure
+from auth_client import ACCESS_TOKEN_TTL_SECONDS, AuthClient, TokenSnapshot
 
 
 @pytest.fixture
 def auth_client():
-    with patch.dict(os.environ, {"WME_USERNAME": "test_user", "WME_PASSWORD": "test_pass"}):
-        return AuthClient()
+    return AuthClient()
 
 
 def test_init(auth_client):
@@ -19,7 +22,35 @@ def test_init(auth_client):
     assert auth_client.base_url == "https://auth.enterprise.wikimedia.com/v1"
 
 
-@patch('requests.post')
+def test_init_reads_credentials_once(auth_client):
+    with patch('os.getenv') as mock_getenv, patch('auth_client.load_dotenv') as mock_load_dotenv:
+        client = AuthClient(token_store_file=None)
+    mock_getenv.assert_not_called()
+    mock_load_dotenv.assert_not_called()
+    assert client.username == "test_user"
+
+
+def test_clients_share_session(auth_client):
+    assert AuthClient(token_store_file=None).session is auth_client.session
+
+
+def test_init_requires_credentials(monkeypatch):
+    monkeypatch.delenv("WME_PASSWORD")
+    with pytest.raises(ValueError):
+        AuthClient(token_store_file=None)
+
+
+def test_init_picks_up_credentials_set_later(monkeypatch):
+    monkeypatch.delenv("WME_PASSWORD")
+    with pytest.raises(ValueError):
+        AuthClient(token_store_file=None)
+
+    # The failed lookup is not cached
+    monkeypatch.setenv("WME_PASSWORD", "test_pass")
+    assert AuthClient(token_store_file=None).password == "test_pass"
+
+
+@patch('requests.Session.post')
 def test_login(mock_post, auth_client):
     mock_post.return_value.status_code = 200
     mock_post.return_value.json.return_value = {
@@ -31,7 +62,7 @@ def test_login(mock_post, auth_client):
     assert response["refresh_token"] == "refresh_token_value"
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_refresh_token(mock_post, auth_client):
     mock_post.return_value.status_code = 200
     mock_post.return_value.json.return_value = {
@@ -41,22 +72,62 @@ def test_refresh_token(mock_post, auth_client):
     assert response["access_token"] == "new_access_token"
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_revoke_token(mock_post, auth_client):
     mock_post.return_value.status_code = 200
     auth_client.revoke_token("refresh_token_value")
     mock_post.assert_called_with(
         "https://auth.enterprise.wikimedia.com/v1/token-revoke",
-        json={"refresh_token": "refresh_token_value"}
+        json={"refresh_token": "refresh_token_value"},
+        timeout=(10, 30)
     )
 
 
+@patch('time.sleep')
+@patch('requests.Session.post')
+def test_login_retries_transient_errors(mock_post, mock_sleep, auth_client):
+    bad_gateway = MagicMock(status_code=502)
+    bad_gateway.raise_for_status.side_effect = requests.HTTPError(response=bad_gateway)
+    ok = MagicMock()
+    ok.json.return_value = {"access_token": "access_token_value", "refresh_token": "refresh_token_value"}
+    mock_post.side_effect = [requests.ConnectionError(), bad_gateway, ok]
+
+    assert auth_client.login()["access_token"] == "access_token_value"
+    assert mock_post.call_count == 3
+    assert [c[0][0] for c in mock_sleep.call_args_list] == [0.5, 1.0]
+
+
+@patch('time.sleep')
+@patch('requests.Session.post')
+def test_post_does_not_retry_client_errors_or_revoke(mock_post, mock_sleep, auth_client):
+    unauthorized = MagicMock(status_code=401)
+    unauthorized.raise_for_status.side_effect = requests.HTTPError(response=unauthorized)
+    mock_post.return_value = unauthorized
+    with pytest.raises(requests.HTTPError):
+        auth_client.login()
+    assert mock_post.call_count == 1
+
+    mock_post.reset_mock()
+    mock_post.side_effect = requests.ConnectionError()
+    with pytest.raises(requests.ConnectionError):
+        auth_client.revoke_token("refresh_token_value")
+    assert mock_post.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+@patch('requests.Session.post')
+def test_post_empty_body(mock_post, auth_client):
+    mock_post.return_value.content = b''
+    assert auth_client._post("/token-revoke", {"refresh_token": "refresh_token_value"}) == {}
+    mock_post.return_value.json.assert_not_called()
+
+
 @patch('os.path.exists')
 @patch('builtins.open', new_callable=mock_open, read_data=json.dumps({
     "access_token": "stored_access_token",
-    "access_token_generated_at": (datetime.now() - timedelta(hours=1)).isoformat(),
+    "access_token_generated_at": time.time() - 3600,
     "refresh_token": "stored_refresh_token",
-    "refresh_token_generated_at": (datetime.now() - timedelta(days=1)).isoformat()
+    "refresh_token_generated_at": time.time() - 24 * 3600
 }))
 def test_get_access_token_valid(mock_open, mock_exists, auth_client):
     mock_exists.return_value = True
@@ -64,6 +135,69 @@ def test_get_access_token_valid(mock_open, mock_exists, auth_client):
     assert token == "stored_access_token"
 
 
+@patch('os.path.exists')
+@patch('builtins.open', new_callable=mock_open, read_data=json.dumps({
+    "access_token": "stored_access_token",
+    "access_token_generated_at": (datetime.now() - timedelta(hours=1)).isoformat(),
+    "refresh_token": "stored_refresh_token",
+    "refresh_token_generated_at": (datetime.now() - timedelta(days=1)).isoformat()
+}))
+def test_get_access_token_reads_store_once(mock_open, mock_exists, auth_client):
+    mock_exists.return_value = True
+    assert auth_client.get_access_token() == "stored_access_token"
+    assert auth_client.get_access_token() == "stored_access_token"
+    mock_open.assert_called_once()
+    mock_exists.assert_called_once()
+
+
+@patch('os.path.exists')
+@patch('builtins.open', new_callable=mock_open, read_data=json.dumps({
+    "access_token": "stored_access_token",
+    "access_token_generated_at": (datetime.now() - timedelta(hours=1)).isoformat(),
+    "refresh_token": "stored_refresh_token",
+    "refresh_token_generated_at": (datetime.now() - timedelta(days=1)).isoformat()
+}))
+def test_get_access_token_fresh_token_skips_lock(mock_open, mock_exists, auth_client):
+    mock_exists.return_value = True
+    auth_client.get_access_token()
+
+    auth_client.lock = MagicMock()
+    assert auth_client.get_access_token() == "stored_access_token"
+    auth_client.lock.__enter__.assert_not_called()
+
+
+def test_token_snapshot_reads_iso_timestamps():
+    # Stores written by older versions keep ISO-8601 timestamps instead of epoch seconds
+    generated_at = datetime(2024, 1, 1, 12)
+    iso = TokenSnapshot.from_store({
+        "access_token": "a", "access_token_generated_at": generated_at.isoformat(),
+        "refresh_token": "r", "refresh_token_generated_at": generated_at.isoformat()
+    })
+    epoch = TokenSnapshot.from_store({
+        "access_token": "a", "access_token_generated_at": generated_at.timestamp(),
+        "refresh_token": "r", "refresh_token_generated_at": generated_at.timestamp()
+    })
+    assert iso.access_token_expires_at == pytest.approx(epoch.access_token_expires_at, abs=0.1)
+    assert epoch.access_token_expires_at - time.time() == pytest.approx(
+        generated_at.timestamp() + ACCESS_TOKEN_TTL_SECONDS - time.time(), abs=0.1)
+
+
+def test_token_snapshot_uses_jwt_expiry():
+    def jwt(claims):
+        payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b'=').decode()
+        return f"header.{payload}.signature"
+
+    store = {"refresh_token": "r", "access_token_generated_at": time.time(), "refresh_token_generated_at": time.time()}
+
+    snapshot = TokenSnapshot.from_store(dict(store, access_token=jwt({"exp": time.time() + 600})))
+    assert snapshot.access_token_expires_at - time.time() == pytest.approx(600, abs=1)
+
+    # Tokens that are not JWTs, or carry no exp claim, fall back to the fixed lifetime
+    for token in ("opaque", jwt({"sub": "user"}), "a.!!!.c"):
+        snapshot = TokenSnapshot.from_store(dict(store, access_token=token))
+        assert snapshot.access_token_expires_at - time.time() == pytest.approx(ACCESS_TOKEN_TTL_SECONDS, abs=1)
+
+
 @patch('os.path.exists')
 @patch('auth_client.AuthClient._refresh_and_store_tokens')
 @patch('builtins.open', new_callable=mock_open, read_data=json.dumps({
@@ -80,6 +214,22 @@ def test_get_access_token_refresh(mock_open, mock_refresh, mock_exists, auth_cli
     assert token == "new_access_token"
 
 
+@patch('os.path.exists')
+@patch('auth_client.AuthClient._refresh_and_store_tokens')
+@patch('builtins.open', new_callable=mock_open, read_data=json.dumps({
+    "access_token": "stored_access_token",
+    "access_token_generated_at": (datetime.now() - timedelta(hours=1)).isoformat(),
+    "refresh_token": "stored_refresh_token",
+    "refresh_token_generated_at": (datetime.now() - timedelta(days=1)).isoformat()
+}))
+def test_renew_access_token_refreshes_fresh_token(mock_open, mock_refresh, mock_exists, auth_client):
+    mock_exists.return_value = True
+    mock_refresh.return_value = "new_access_token"
+    assert auth_client.renew_access_token() == "new_access_token"
+    mock_refresh.assert_called_with("stored_refresh_token")
+    assert auth_client.access_token_expires_in() > 0
+
+
 @patch('os.path.exists')
 @patch('auth_client.AuthClient._login_and_store_tokens')
 def test_get_access_token_login(mock_login, mock_exists, auth_client):
@@ -90,6 +240,55 @@ def test_get_access_token_login(mock_login, mock_exists, auth_client):
     assert token == "new_access_token"
 
 
+@pytest.mark.skipif(os.name != "posix", reason="file modes are POSIX only")
+def test_store_tokens_is_owner_only(auth_client, tmp_path):
+    auth_client.token_store_file = str(tmp_path / "tokenstore.json")
+    token_store = {
+        "access_token": "access_token_value",
+        "access_token_generated_at": time.time(),
+        "refresh_token": "refresh_token_value",
+        "refresh_token_generated_at": time.time()
+    }
+
+    auth_client._store_tokens(token_store)
+
+    assert os.stat(auth_client.token_store_file).st_mode & 0o777 == 0o600
+    assert os.listdir(tmp_path) == ["tokenstore.json"]
+    with open(auth_client.token_store_file) as f:
+        assert json.load(f) == token_store
+
+
+def test_store_tokens_keeps_old_store_on_failed_write(auth_client, tmp_path):
+    auth_client.token_store_file = str(tmp_path / "tokenstore.json")
+    token_store = {
+        "access_token": "access_token_value",
+        "access_token_generated_at": time.time(),
+        "refresh_token": "refresh_token_value",
+        "refresh_token_generated_at": time.time()
+    }
+    auth_client._store_tokens(token_store)
+
+    with patch('os.fdopen', side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            auth_client._store_tokens(dict(token_store, access_token="new_access_token"))
+
+    assert auth_client._read_store() == token_store
+
+
+def test_store_tokens_without_orjson(auth_client, tmp_path):
+    auth_client.token_store_file = str(tmp_path / "tokenstore.json")
+    token_store = {
+        "access_token": "access_token_value",
+        "access_token_generated_at": time.time(),
+        "refresh_token": "refresh_token_value",
+        "refresh_token_generated_at": time.time()
+    }
+
+    with patch('auth_client.orjson', None):
+        auth_client._store_tokens(token_store)
+        assert auth_client._read_store() == token_store
+
+
 @patch('os.path.exists')
 @patch('builtins.open', new_callable=mock_open, read_data=json.dumps({
     "access_token": "stored_access_token",
@@ -104,3 +303,164 @@ def test_clear_state(mock_remove, mock_open, mock_exists, auth_client):
         auth_client.clear_state()
         mock_revoke.assert_called_with("stored_refresh_token")
     mock_remove.assert_called_with("tokenstore.json")
+
+
+@patch('os.path.exists')
+@patch('auth_client.AuthClient.login')
+def test_in_memory_token_store(mock_login, mock_exists):
+    mock_login.return_value = {"access_token": "access_token_value", "refresh_token": "refresh_token_value"}
+    client = AuthClient(token_store_file=None)
+
+    with patch('builtins.open') as mock_file, patch('os.open') as mock_os_open:
+        assert client.get_access_token() == "access_token_value"
+        assert client.get_access_token() == "access_token_value"
+        mock_file.assert_not_called()
+        mock_os_open.assert_not_called()
+    mock_exists.assert_not_called()
+    mock_login.assert_called_once()
+
+    with patch.object(client, 'revoke_token') as mock_revoke:
+        client.clear_state()
+        mock_revoke.assert_called_with("refresh_token_value")
+    assert client.access_token_expires_in() is None
+
+
+def test_get_access_token_refreshes_after_suspend(auth_client):
+    auth_client.token_store_file = None
+    auth_client._store_tokens({
+        "access_token": "access_token_value",
+        "access_token_generated_at": time.time(),
+        "refresh_token": "refresh_token_value",
+        "refresh_token_generated_at": time.time()
+    })
+
+    # A two day suspend moves the wall clock on but not time.monotonic(); the token
+    # has expired by then and must be refreshed rather than served
+    resumed_at = time.time() + 2 * 24 * 3600
+    with patch('time.time', return_value=resumed_at), \
+            patch('time.monotonic', return_value=time.monotonic()), \
+            patch.object(auth_client, 'refresh_token',
+                         return_value={"access_token": "new_access_token"}) as mock_refresh:
+        assert auth_client.get_access_token() == "new_access_token"
+    mock_refresh.assert_called_once_with("refresh_token_value")
+
+
+def test_concurrent_callers_share_one_refresh(auth_client):
+    auth_client.token_store_file = None
+    auth_client._current = TokenSnapshot("expired_access_token", time.time() - 1,
+                                         "stored_refresh_token", time.time() + 3600)
+    start = threading.Barrier(8)
+
+    def refresh_token(refresh_token):
+        time.sleep(0.1)  # hold the lock long enough for every caller to queue up behind it
+        return {"access_token": "new_access_token"}
+
+    def call():
+        start.wait()
+        results.append(auth_client.get_access_token())
+
+    results = []
+    with patch.object(auth_client, 'refresh_token', side_effect=refresh_token) as mock_refresh:
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    mock_refresh.assert_called_once_with("stored_refresh_token")
+    assert results == ["new_access_token"] * 8
+
+
+def test_concurrent_callers_share_a_failed_refresh(auth_client):
+    auth_client.token_store_file = None
+    auth_client._current = TokenSnapshot("expired_access_token", time.time() - 1,
+                                         "stored_refresh_token", time.time() + 3600)
+    start = threading.Barrier(50)
+
+    def refresh_token(refresh_token):
+        time.sleep(0.1)  # keep the refresh in flight while every caller arrives
+        raise requests.HTTPError("503 Server Error")
+
+    def call():
+        start.wait()
+        try:
+            auth_client.get_access_token()
+        except requests.HTTPError as e:
+            errors.append(e)
+
+    errors = []
+    with patch.object(auth_client, 'refresh_token', side_effect=refresh_token) as mock_refresh:
+        threads = [threading.Thread(target=call) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # One failed request is reported to every caller instead of being repeated 50 times
+    mock_refresh.assert_called_once_with("stored_refresh_token")
+    assert len(errors) == 50
+
+
+def test_init_preloads_token_store(tmp_path):
+    token_store_file = tmp_path / "tokenstore.json"
+    token_store_file.write_text(json.dumps({
+        "access_token": "stored_access_token",
+        "access_token_generated_at": time.time(),
+        "refresh_token": "stored_refresh_token",
+        "refresh_token_generated_at": time.time()
+    }))
+    client = AuthClient(token_store_file=str(token_store_file))
+
+    with patch('builtins.open') as mock_file:
+        assert client.get_access_token() == "stored_access_token"
+        mock_file.assert_not_called()
+
+
+def test_stale_token_is_served_while_refreshing(auth_client):
+    auth_client.token_store_file = None
+    auth_client._current = TokenSnapshot("stale_access_token", time.time() + 60,
+                                         "stored_refresh_token", time.time() + 3600)
+    release = threading.Event()
+
+    def refresh_token(refresh_token):
+        assert release.wait(5)
+        return {"access_token": "new_access_token"}
+
+    with patch.object(auth_client, 'refresh_token', side_effect=refresh_token) as mock_refresh:
+        # Neither call waits for the refresh, and only one refresh is started
+        assert auth_client.get_access_token() == "stale_access_token"
+        assert auth_client.get_access_token() == "stale_access_token"
+
+        release.set()
+        assert auth_client._refresh_future.result(timeout=5) == "new_access_token"
+
+    mock_refresh.assert_called_once_with("stored_refresh_token")
+    assert auth_client.get_access_token() == "new_access_token"
+
+
+@patch('auth_client.logger')
+def test_failed_background_refresh_backs_off(mock_logger, auth_client):
+    auth_client.token_store_file = None
+    auth_client._current = TokenSnapshot("stale_access_token", time.time() + 60,
+                                         "stored_refresh_token", time.time() + 3600)
+
+    with patch.object(auth_client, 'refresh_token', side_effect=requests.HTTPError("503 Server Error")) as mock_refresh:
+        assert auth_client.get_access_token() == "stale_access_token"
+        with pytest.raises(requests.HTTPError):
+            auth_client._refresh_future.result(timeout=5)
+
+        # Calls inside the backoff keep getting the stale token without another attempt
+        for _ in range(100):
+            assert auth_client.get_access_token() == "stale_access_token"
+        assert mock_refresh.call_count == 1
+        assert auth_client._background_retry_at - time.monotonic() == pytest.approx(5, abs=1)
+        mock_logger.warning.assert_called_once_with("Background token refresh failed, retrying in 5s: 503 Server Error")
+
+        # Once it has passed the refresh is tried again, and the next wait is doubled
+        auth_client._background_retry_at = time.monotonic()
+        auth_client.get_access_token()
+        with pytest.raises(requests.HTTPError):
+            auth_client._refresh_future.result(timeout=5)
+        assert mock_refresh.call_count == 2
+        assert auth_client._background_retry_at - time.monotonic() == pytest.approx(10, abs=1)
+        mock_logger.warning.assert_called_with("Background token refresh failed, retrying in 10s: 503 Server Error")
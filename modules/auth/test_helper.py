@@ -1,19 +1,55 @@
 import pytest
-from unittest.mock import MagicMock, patch
-from helper import Helper  # Assuming the class is saved in helper.py
+import requests
+import sched
+import threading
+from unittest.mock import Mock, create_autospec, patch
+from auth_client import AuthClient, TokenSnapshot
+from helper import Helper, _SHARED_SCHEDULER  # Assuming the class is saved in helper.py
 import time
 
 
 @pytest.fixture
 def mock_auth_client():
-    auth_client = MagicMock()
+    auth_client = create_autospec(AuthClient, instance=True)
     auth_client.get_access_token.return_value = "test_token"
     return auth_client
 
 
 @pytest.fixture
-def helper(mock_auth_client):
-    helper = Helper(mock_auth_client, wait_seconds=1)  # Setting wait time to 1 second for faster tests
+def real_auth_client():
+    return AuthClient(token_store_file=None)
+
+
+class FakeClock:
+    """Drives a helper's scheduler on made-up time, so tests never really wait."""
+
+    def __init__(self):
+        self.now = 0
+        self.scheduler = sched.scheduler(self.time, self.sleep)
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        # Runs every refresh falling due in the next `seconds`, including ones they schedule
+        end = self.now + seconds
+        while not self.scheduler.empty() and self.scheduler.queue[0].time <= end:
+            self.now = self.scheduler.queue[0].time
+            self.scheduler.run(blocking=False)
+        self.now = end
+
+
+@pytest.fixture
+def fake_clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def helper(mock_auth_client, fake_clock):
+    helper = Helper(mock_auth_client, wait_seconds=1, scheduler=fake_clock.scheduler)
     yield helper
     helper.stop()
 
@@ -25,38 +61,176 @@ def test_get_access_token(helper, mock_auth_client):
 
 
 @patch('helper.logger')
-def test_refresh_token_periodically(mock_logger, helper, mock_auth_client):
-    # Mock the get_access_token method to do nothing
-    mock_auth_client.get_access_token.return_value = None
+def test_refresh_token_periodically(mock_logger, helper, mock_auth_client, fake_clock):
+    # Mock the renew_access_token method to do nothing
+    mock_auth_client.renew_access_token.return_value = None
 
-    # Wait for 2 seconds to allow multiple refresh attempts
-    time.sleep(2)
-
-    if helper.refresh_thread.is_alive():
-        helper.stop_event.set()
+    # Let three refresh periods pass
+    fake_clock.advance(helper.wait_seconds * 3)
 
+    assert mock_auth_client.renew_access_token.call_count == 3
     mock_logger.info.assert_called_with("Token refreshed successfully")
 
 
 @patch('helper.logger')
-def test_refresh_token_periodically_with_exception(mock_logger, helper, mock_auth_client):
-    # Mock the get_access_token method to raise an exception
-    mock_auth_client.get_access_token.side_effect = Exception("Test exception")
+def test_refresh_token_periodically_with_exception(mock_logger, helper, mock_auth_client, fake_clock):
+    calls = []
+
+    def renew_access_token():
+        calls.append(fake_clock.now)
+        raise Exception("Test exception")
 
-    # Wait for 2 seconds to allow multiple refresh attempts
-    time.sleep(2)
+    mock_auth_client.renew_access_token.side_effect = renew_access_token
 
-    if helper.refresh_thread.is_alive():
-        helper.stop_event.set()
+    fake_clock.advance(helper.wait_seconds * 20)
 
+    # Each failure doubles the wait before the next attempt, plus some jitter
+    assert len(calls) == 4
+    gaps = [later - earlier for earlier, later in zip(calls, calls[1:])]
+    for failures, gap in enumerate(gaps, 1):
+        backoff = helper.wait_seconds * 2 ** failures
+        assert backoff <= gap <= backoff * 1.1
     mock_logger.error.assert_called_with("Failed to refresh token: Test exception")
 
 
 def test_stop(helper, mock_auth_client):
     helper.stop()
-    assert not helper.refresh_thread.is_alive()
-    mock_auth_client.revoke_token.assert_called_once()
+    assert helper.scheduler.empty()
+    mock_auth_client.clear_state.assert_called_once_with()
+
 
+def test_stop_waits_for_refresh_in_flight(mock_auth_client, fake_clock):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
 
-def test_refresh_thread_running(helper):
-    assert helper.refresh_thread.is_alive()
+    def renew_access_token():
+        calls.append("renew")
+        started.set()
+        assert release.wait(5)
+
+    mock_auth_client.renew_access_token.side_effect = renew_access_token
+    mock_auth_client.clear_state.side_effect = lambda: calls.append("clear_state")
+    helper = Helper(mock_auth_client, wait_seconds=1, scheduler=fake_clock.scheduler)
+
+    refresher = threading.Thread(target=fake_clock.advance, args=(1,))
+    refresher.start()
+    assert started.wait(5)
+
+    stopper = threading.Thread(target=helper.stop)
+    stopper.start()
+    stopper.join(0.1)
+    # stop() holds off clearing the tokens until the refresh is done
+    assert stopper.is_alive()
+    assert calls == ["renew"]
+
+    release.set()
+    stopper.join(5)
+    refresher.join(5)
+    assert calls == ["renew", "clear_state"]
+    assert fake_clock.scheduler.empty()
+
+
+def test_refresh_scheduled(mock_auth_client):
+    helper = Helper(mock_auth_client, wait_seconds=3600)
+    try:
+        assert helper._scheduled_event in _SHARED_SCHEDULER.queue
+    finally:
+        helper.stop()
+    assert helper._scheduled_event not in _SHARED_SCHEDULER.queue
+
+
+def test_helpers_share_one_thread(mock_auth_client):
+    helpers = [Helper(mock_auth_client, wait_seconds=3600) for _ in range(10)]
+    try:
+        names = [thread.name for thread in threading.enumerate()]
+        assert names.count("wme-token-scheduler") == 1
+    finally:
+        for helper in helpers:
+            helper.stop()
+
+
+def test_injected_scheduler(mock_auth_client, fake_clock):
+    helper = Helper(mock_auth_client, wait_seconds=60, scheduler=fake_clock.scheduler)
+
+    # Nothing runs until the caller drives its scheduler
+    fake_clock.advance(59)
+    mock_auth_client.renew_access_token.assert_not_called()
+
+    fake_clock.advance(1)
+    mock_auth_client.renew_access_token.assert_called_once()
+    assert helper._scheduled_event in fake_clock.scheduler.queue
+
+    helper.stop()
+    assert fake_clock.scheduler.empty()
+
+
+@patch('helper.random.uniform', return_value=0)
+def test_next_wait_tracks_token_expiry(mock_uniform, mock_auth_client):
+    mock_auth_client.access_token_expires_in.return_value = 10 * 3600
+    helper = Helper(mock_auth_client)
+    try:
+        assert helper._next_wait(0) == 0.9 * 10 * 3600
+
+        # Failed refreshes back off exponentially, up to a cap
+        assert [helper._next_wait(n) for n in (1, 2, 3, 10)] == [30, 60, 120, 600]
+
+        # A fixed period backs off from the period itself
+        helper.wait_seconds = 10
+        assert [helper._next_wait(n) for n in (0, 1, 2, 10)] == [10, 20, 40, 600]
+        helper.wait_seconds = None
+
+        # Without a token, one is fetched straight away
+        mock_auth_client.access_token_expires_in.return_value = None
+        assert helper._next_wait(0) == 0
+    finally:
+        helper.stop()
+
+
+def test_concurrent_get_access_token_refreshes_once(real_auth_client):
+    real_auth_client._current = TokenSnapshot("expired_access_token", time.time() - 1,
+                                              "stored_refresh_token", time.time() + 3600)
+    start = threading.Barrier(20)
+    results = []
+
+    def refresh_token(refresh_token):
+        time.sleep(0.1)  # keep the refresh in flight while the other callers arrive
+        return {"access_token": "new_access_token"}
+
+    def call():
+        start.wait()
+        results.append(helper.get_access_token())
+
+    with patch.object(real_auth_client, 'refresh_token', side_effect=refresh_token) as mock_refresh, \
+            patch.object(real_auth_client, 'revoke_token', autospec=True) as mock_revoke:
+        helper = Helper(real_auth_client, wait_seconds=3600)
+        try:
+            threads = [threading.Thread(target=call) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            helper.stop()
+
+    mock_refresh.assert_called_once_with("stored_refresh_token")
+    assert results == ["new_access_token"] * 20
+    mock_revoke.assert_called_once_with("stored_refresh_token")
+
+
+def test_helper_reuses_session(fake_clock):
+    session = requests.Session()
+    response = Mock(content=b"{}")
+    response.json.return_value = {"access_token": "new_access_token", "refresh_token": "new_refresh_token"}
+
+    with patch('requests.Session.post', autospec=True, return_value=response) as mock_post:
+        auth_client = AuthClient(token_store_file=None, session=session)
+        helper = Helper(auth_client, wait_seconds=60, scheduler=fake_clock.scheduler)
+        # A login, then two refreshes, then the revoke on stop
+        fake_clock.advance(180)
+        helper.stop()
+
+    urls = [call.args[1].rsplit("/", 1)[-1] for call in mock_post.call_args_list]
+    assert urls == ["login", "token-refresh", "token-refresh", "token-revoke"]
+    assert mock_post.call_args.kwargs["json"] == {"refresh_token": "new_refresh_token"}
+    assert all(call.args[0] is session for call in mock_post.call_args_list)